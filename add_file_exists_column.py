@@ -4,96 +4,213 @@ Script to add a 'File Exists' column to consignas.csv files.
 Checks if the files referenced in the 'File ID' column exist in the directory.
 
 Usage:
-    python add_file_exists_column.py <directory> [--force]
+    python add_file_exists_column.py <directory> [<directory> ...] [--force]
 
 Example:
     python add_file_exists_column.py data/POS1
     python add_file_exists_column.py data/POS1 --force
+    python add_file_exists_column.py data/POS1 data/POS2 data/PRE --force
 """
 
 import csv
+import os
+import shutil
 import sys
 from pathlib import Path
 
 
-def add_file_exists_column(directory, force=False):
+def _fast_exists(path):
+    """
+    Check whether a path exists with a bare os.stat() call, skipping the
+    Path.exists() wrapper. Symlinks are followed, like Path.exists().
+    """
+    try:
+        os.stat(path)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def list_directory(dir_path):
+    """
+    Return the set of entry names in a directory using a single os.scandir() pass.
+
+    Symlinks are left out: a dangling one would otherwise count as existing,
+    so they fall through to the exists() check, which follows the link.
+    """
+    with os.scandir(dir_path) as it:
+        return {entry.name for entry in it if not entry.is_symlink()}
+
+
+def scan_all(directories):
+    """
+    List several directories up front, one os.scandir() pass each, so a
+    pipeline over many CSVs reads every directory exactly once.
+
+    Directories that cannot be read are left out; add_file_exists_column
+    reports them when it tries to list them itself.
+
+    Returns:
+        dict: Directory (as given) -> set of entry names
+    """
+    listings = {}
+    for directory in directories:
+        try:
+            listings[directory] = list_directory(directory)
+        except OSError:
+            pass
+    return listings
+
+
+def file_id_exists(dir_path, file_id, listings):
+    """
+    Check whether a File ID exists under dir_path using cached directory listings.
+
+    File IDs may contain subpaths (e.g. 'sub/file.txt'); each parent directory
+    is scanned once and cached in `listings`, keyed by its relative path.
+    Names missing from the listing fall back to a real exists() check so that
+    case-insensitive filesystems give the same answer as before.
+    """
+    parent, _, name = file_id.rpartition('/')
+    if parent not in listings:
+        try:
+            listings[parent] = list_directory(dir_path / parent)
+        except OSError:
+            listings[parent] = set()
+    return name in listings[parent] or _fast_exists(dir_path / file_id)
+
+
+def add_file_exists_column(directory, force=False, names=None):
     """
     Add a 'File Exists' column to the consignas.csv file in the specified directory.
 
     Args:
         directory: Path to the directory containing consignas.csv and .txt files
+        force: Overwrite an existing 'File Exists' column without asking
+        names: Entry names of the directory, if already listed (see scan_all)
+
+    Returns:
+        bool: False if the directory is missing or unreadable, its CSV is
+        missing, or the CSV has rows longer than its header, True otherwise
+        (including when the user declines to overwrite the column)
     """
     dir_path = Path(directory)
     csv_path = dir_path / "consignas.csv"
 
     if not dir_path.exists():
         print(f"Error: Directory '{directory}' does not exist")
-        sys.exit(1)
+        return False
 
     if not csv_path.exists():
         print(f"Error: File '{csv_path}' does not exist")
-        sys.exit(1)
-
-    # Read the CSV file
-    rows = []
+        return False
+
+    # List the directory once instead of calling exists() per row
+    if names is None:
+        try:
+            names = list_directory(dir_path)
+        except OSError as e:
+            print(f"Error: Cannot read directory '{directory}': {e.strerror}")
+            return False
+    listings = {'': names}
+
+    # Stream the CSV into a sibling temp file, then swap it in atomically
+    tmp_path = csv_path.with_suffix('.csv.tmp')
+    total = 0
+    existing = 0
     with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        fieldnames = reader.fieldnames
+        reader = csv.reader(f)
+        header = next(reader, [])
 
         # Check if 'File Exists' column already exists
-        if 'File Exists' in fieldnames:
+        exists_index = None
+        if 'File Exists' in header:
             if not force:
                 print(f"Warning: 'File Exists' column already exists in {csv_path}")
                 response = input("Do you want to overwrite it? (y/n): ")
                 if response.lower() != 'y':
-                    print("Aborted.")
-                    sys.exit(0)
-            # Remove the existing column from fieldnames for reconstruction
-            new_fieldnames = [f for f in fieldnames if f != 'File Exists']
-        else:
-            new_fieldnames = list(fieldnames)
-
-        # Add 'File Exists' to fieldnames
-        new_fieldnames.append('File Exists')
-
-        for row in reader:
-            # Try both 'File ID' and 'FileID' column names
-            file_id = row.get('File ID') or row.get('FileID', '')
-            if file_id:
-                file_path = dir_path / file_id
-                row['File Exists'] = 'true' if file_path.exists() else 'false'
-            else:
-                row['File Exists'] = 'false'
-            rows.append(row)
-
-    # Write the updated CSV file
-    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=new_fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+                    print(f"Skipped {csv_path}.")
+                    return True
+            # Remove the existing column from the header for reconstruction
+            exists_index = header.index('File Exists')
+            del header[exists_index]
+
+        # Add 'File Exists' to the header
+        header.append('File Exists')
+        width = len(header)
+
+        # Try both 'File ID' and 'FileID' column names
+        id_indexes = [header.index(name) for name in ('File ID', 'FileID') if name in header]
+
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(header)
+
+                for row in reader:
+                    if not row:
+                        continue
+                    if exists_index is not None and exists_index < len(row):
+                        del row[exists_index]
+                    if len(row) > width - 1:
+                        raise ValueError(
+                            f"line {reader.line_num} has {len(row)} fields but the header "
+                            f"has {width - 1}"
+                        )
+                    # Pad short rows so the new column lines up with the header
+                    row.extend([''] * (width - 1 - len(row)))
+
+                    file_id = next((row[i] for i in id_indexes if row[i]), '')
+                    exists = bool(file_id) and file_id_exists(dir_path, file_id, listings)
+                    row.append('true' if exists else 'false')
+                    writer.writerow(row)
+
+                    total += 1
+                    existing += exists
+        except ValueError as e:
+            tmp_path.unlink(missing_ok=True)
+            print(f"Error: {csv_path}: {e}; file left unchanged")
+            return False
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    # Keep the original file's permissions on the replacement
+    shutil.copymode(csv_path, tmp_path)
+    os.replace(tmp_path, csv_path)
 
     # Print statistics
-    total = len(rows)
-    existing = sum(1 for row in rows if row['File Exists'] == 'true')
     missing = total - existing
 
     print(f"\nProcessing complete for {csv_path}")
     print(f"Total rows: {total}")
     print(f"Files existing: {existing}")
     print(f"Files missing: {missing}")
+    return True
 
 
 def main():
-    if len(sys.argv) < 2 or len(sys.argv) > 3:
-        print("Usage: python add_file_exists_column.py <directory> [--force]")
+    args = sys.argv[1:]
+    force = '--force' in args
+    directories = [arg for arg in args if arg != '--force']
+
+    if not directories:
+        print("Usage: python add_file_exists_column.py <directory> [<directory> ...] [--force]")
         print("\nExample:")
         print("  python add_file_exists_column.py data/POS1")
         print("  python add_file_exists_column.py data/POS1 --force")
+        print("  python add_file_exists_column.py data/POS1 data/POS2 data/PRE --force")
         sys.exit(1)
 
-    directory = sys.argv[1]
-    force = len(sys.argv) == 3 and sys.argv[2] == '--force'
-    add_file_exists_column(directory, force)
+    # Scan every existing directory once; missing or unreadable ones are
+    # reported and skipped by add_file_exists_column without stopping the others
+    listings = scan_all(d for d in directories if os.path.isdir(d))
+    failed = [directory for directory in directories
+              if not add_file_exists_column(directory, force, listings.get(directory))]
+
+    if failed:
+        print(f"\nFailed: {', '.join(failed)}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -12,16 +12,19 @@ Usage:
 """
 
 import argparse
+import os
+import shutil
 import sys
-import json
-import time
-import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime
 
+import orjson
 import requests
 import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 # Configuration
@@ -29,19 +32,50 @@ DEFAULT_API_PORT = "8000"
 DEFAULT_FOLDERS = ['POS1', 'POS2', 'PRE']
 DEFAULT_DATA_DIR = 'data'
 DEFAULT_BATCH_SIZE = 10
+DEFAULT_CONCURRENCY = 4
+NOR_SUFFIX = '_NOR.txt'
+
+# Catalan ordinal mapping for ESO grades, keyed by the grade digit of the ID
+CURSO_ORDINALS = {
+    '1': '1r ESO',
+    '2': '2n ESO',
+    '3': '3r ESO',
+    '4': '4t ESO',
+    '5': '5è ESO',
+    '6': '6è ESO'
+}
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """
+    Create an HTTP session shared by all API calls, so connections (and TLS
+    sessions) are kept alive and reused instead of opened per request.
+    Idempotent requests are retried on connection errors with backoff.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=3, backoff_factor=0.5)
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
 
 
 def load_consignas_csv(folder_path: Path) -> pd.DataFrame:
     """
     Load the consignas CSV file for a given folder.
     Handles different column name variations (File ID vs FileID, Consigna vs TEXTpost2)
+    The ID column is read as strings so it can be matched against file IDs directly.
+    Parsing uses pyarrow's multi-threaded CSV reader.
     """
     csv_path = folder_path / 'consignas.csv'
     if not csv_path.exists():
         print(f"Warning: {csv_path} not found")
         return pd.DataFrame()
 
-    df = pd.read_csv(csv_path)
+    df = pd.read_csv(csv_path, dtype={'ID': str}, engine='pyarrow')
 
     # Normalize column names
     if 'File ID' in df.columns:
@@ -52,21 +86,36 @@ def load_consignas_csv(folder_path: Path) -> pd.DataFrame:
     return df
 
 
+def index_consignas(consignas_df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Map each consigna ID to its consigna text (missing texts become 'N/A').
+    Built from reversed plain lists so the first row per ID wins.
+    """
+    ids = consignas_df['ID'].tolist()
+    consignas = consignas_df['Consigna'].fillna('N/A').tolist()
+    return dict(zip(reversed(ids), reversed(consignas)))
+
+
 def get_nor_files(folder_path: Path) -> List[Path]:
     """
     Get all _NOR.txt files in a folder, sorted by name.
     """
-    nor_files = sorted(folder_path.glob('*_NOR.txt'))
-    return nor_files
+    with os.scandir(folder_path) as entries:
+        names = [entry.name for entry in entries
+                 if entry.name.endswith(NOR_SUFFIX) and entry.is_file()]
+    names.sort()
+    return [folder_path / name for name in names]
 
 
 def extract_id_from_filename(filename: str) -> Optional[str]:
     """
     Extract the ID from a filename like 'POS1_11410001_NOR.txt' -> '11410001'
     """
-    match = re.search(r'_(\d+)_NOR\.txt$', filename)
-    if match:
-        return match.group(1)
+    if not filename.endswith(NOR_SUFFIX):
+        return None
+    _, separator, text_id = filename[:-len(NOR_SUFFIX)].rpartition('_')
+    if separator and text_id.isdecimal():
+        return text_id
     return None
 
 
@@ -82,22 +131,16 @@ def extract_curso_from_id(text_id: str) -> str:
     if not text_id or len(text_id) < 3:
         return '4t ESO'  # Default fallback
 
-    try:
-        curso_num = int(text_id[2])
-
-        # Catalan ordinal mapping for ESO grades
-        curso_ordinals = {
-            1: '1r ESO',
-            2: '2n ESO',
-            3: '3r ESO',
-            4: '4t ESO',
-            5: '5è ESO',
-            6: '6è ESO'
-        }
-
-        return curso_ordinals.get(curso_num, f'{curso_num}è ESO')
-    except (ValueError, IndexError):
-        return '4t ESO'  # Default fallback
+    curso_char = text_id[2]
+    curso = CURSO_ORDINALS.get(curso_char)
+    if curso:
+        return curso
+    if curso_char.isdecimal():
+        # Non-ASCII Unicode digits (e.g. '٣') miss the lookup above; int()
+        # normalizes them to map like their ASCII counterparts
+        curso_num = int(curso_char)
+        return CURSO_ORDINALS.get(str(curso_num), f'{curso_num}è ESO')
+    return '4t ESO'  # Default fallback
 
 
 def read_text_file(file_path: Path) -> str:
@@ -112,109 +155,136 @@ def read_text_file(file_path: Path) -> str:
         return ""
 
 
-def submit_evaluation_job(api_base_url: str, items: List[Dict]) -> Optional[Dict]:
+def print_line(line: str) -> None:
+    """
+    Print a whole line with a single write, so lines from batches evaluated
+    in parallel threads never get merged.
+    """
+    sys.stdout.write(line + '\n')
+
+
+def submit_evaluation_job(session: requests.Session, api_base_url: str,
+                          items: List[Dict], label: str = "") -> Optional[Dict]:
     """
     Submit a batch of texts for evaluation.
     Returns the job information including job_id and stream_url.
     """
+    prefix = f"  {label} " if label else ""
     url = f"{api_base_url}/evaluate"
     payload = {"items": items}
 
     try:
-        response = requests.post(url, json=payload, timeout=30)
+        response = session.post(url, json=payload, timeout=30)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Error submitting evaluation job: {e}")
+        print_line(f"{prefix}Error submitting evaluation job: {e}")
         return None
 
 
-def stream_results(api_base_url: str, job_id: str) -> List[Dict]:
+def parse_sse_event(lines: List[bytes]) -> Dict:
+    """
+    Parse the raw lines of a single Server-Sent Event into {'event': ..., 'data': ...}.
+    The data payload is handed to orjson as bytes, which decodes the UTF-8 itself.
+    """
+    event_data = {}
+
+    for line in lines:
+        if line.startswith(b'event:'):
+            event_data['event'] = line[6:].strip().decode('utf-8', 'replace')
+        elif line.startswith(b'data:'):
+            try:
+                event_data['data'] = orjson.loads(line[5:])
+            except orjson.JSONDecodeError:
+                pass
+
+    return event_data
+
+
+def stream_results(session: requests.Session, api_base_url: str, job_id: str,
+                   label: str = "") -> List[Dict]:
     """
     Stream results from the API using Server-Sent Events.
     Returns a list of all evaluation results.
+    Every printed line starts with `label`, so concurrent batches can be told apart.
     """
+    prefix = f"  {label} " if label else "  "
     url = f"{api_base_url}/stream/{job_id}"
     results = []
 
     try:
-        response = requests.get(url, stream=True, timeout=300)
-        response.raise_for_status()
-
-        buffer = ""
-        for chunk in response.iter_content(chunk_size=1024, decode_unicode=True):
-            if chunk:
-                buffer += chunk
-
-                # Process complete events
-                while '\n\n' in buffer:
-                    event_text, buffer = buffer.split('\n\n', 1)
-
-                    # Parse SSE format
-                    lines = event_text.strip().split('\n')
-                    event_data = {}
-
-                    for line in lines:
-                        if line.startswith('event:'):
-                            event_data['event'] = line[6:].strip()
-                        elif line.startswith('data:'):
-                            try:
-                                event_data['data'] = json.loads(line[5:].strip())
-                            except json.JSONDecodeError:
-                                pass
-
-                    # Handle different event types
-                    if event_data.get('event') == 'batch_complete':
-                        batch_results = event_data.get('data', {}).get('results', [])
-                        results.extend(batch_results)
-
-                        # Print progress
-                        progress = event_data.get('data', {}).get('progress', {})
-                        if progress:
-                            print(f"  Progress: {progress.get('completed', 0)}/{progress.get('total', 0)} "
-                                  f"({progress.get('percentage', 0):.1f}%)")
-
-                    elif event_data.get('event') == 'complete':
-                        print("  Job completed successfully")
-                        break
-
-                    elif event_data.get('event') == 'error':
-                        error_msg = event_data.get('data', {}).get('message', 'Unknown error')
-                        print(f"  Error: {error_msg}")
-                        break
+        with session.get(url, stream=True, timeout=300) as response:
+            response.raise_for_status()
+
+            # Accumulate lines until a blank line terminates the event
+            event_lines = []
+            for line in response.iter_lines(chunk_size=1024):
+                if line:
+                    event_lines.append(line)
+                    continue
+                if not event_lines:
+                    continue
+
+                event_data = parse_sse_event(event_lines)
+                event_lines = []
+
+                # Handle different event types
+                if event_data.get('event') == 'batch_complete':
+                    batch_results = event_data.get('data', {}).get('results', [])
+                    results.extend(batch_results)
+
+                    # Print progress
+                    progress = event_data.get('data', {}).get('progress', {})
+                    if progress:
+                        print_line(f"{prefix}Progress: {progress.get('completed', 0)}/{progress.get('total', 0)} "
+                                   f"({progress.get('percentage', 0):.1f}%)")
+
+                elif event_data.get('event') == 'complete':
+                    print_line(f"{prefix}Job completed successfully")
+                    break
+
+                elif event_data.get('event') == 'error':
+                    error_msg = event_data.get('data', {}).get('message', 'Unknown error')
+                    print_line(f"{prefix}Error: {error_msg}")
+                    break
 
         return results
 
     except requests.exceptions.RequestException as e:
-        print(f"Error streaming results: {e}")
+        print_line(f"{prefix if label else ''}Error streaming results: {e}")
         return results
 
 
-def evaluate_texts(api_base_url: str, items: List[Dict]) -> List[Dict]:
+def evaluate_texts(session: requests.Session, api_base_url: str, items: List[Dict],
+                   label: str = "") -> List[Dict]:
     """
     Submit texts for evaluation and wait for results.
+    Every printed line starts with `label` (e.g. '[batch 2/9]'), so the output
+    of batches evaluated concurrently can be traced back to them.
     """
-    print(f"  Submitting {len(items)} texts for evaluation...")
+    prefix = f"  {label} " if label else "  "
+    print_line(f"{prefix}Submitting {len(items)} texts for evaluation...")
 
     # Submit job
-    job_info = submit_evaluation_job(api_base_url, items)
+    job_info = submit_evaluation_job(session, api_base_url, items, label)
     if not job_info:
-        print("  Failed to submit evaluation job")
+        print_line(f"{prefix}Failed to submit evaluation job")
         return []
 
     job_id = job_info.get('job_id')
-    print(f"  Job submitted with ID: {job_id}")
-    print(f"  Estimated time: {job_info.get('estimated_time_seconds', 0)} seconds")
+    print_line(f"{prefix}Job submitted with ID: {job_id}")
+    print_line(f"{prefix}Estimated time: {job_info.get('estimated_time_seconds', 0)} seconds")
 
     # Stream results
-    print("  Streaming results...")
-    results = stream_results(api_base_url, job_id)
+    print_line(f"{prefix}Streaming results...")
+    results = stream_results(session, api_base_url, job_id, label)
 
-    print(f"  Received {len(results)} results")
+    print_line(f"{prefix}Received {len(results)} results")
     return results
 
 
-def process_folder(api_base_url: str, folder_name: str, data_dir: str, batch_size: int) -> pd.DataFrame:
+def process_folder(session: requests.Session, api_base_url: str, folder_name: str, data_dir: str, batch_size: int,
+                   concurrency: int = DEFAULT_CONCURRENCY) -> pd.DataFrame:
     """
     Process all _NOR.txt files in a folder.
     Returns a DataFrame with evaluation results.
@@ -233,6 +303,9 @@ def process_folder(api_base_url: str, folder_name: str, data_dir: str, batch_siz
 
     print(f"Loaded {len(consignas_df)} consignas")
 
+    # Index consignas by ID once instead of filtering the DataFrame for every file
+    consigna_by_id = index_consignas(consignas_df)
+
     # Get all _NOR.txt files
     nor_files = get_nor_files(folder_path)
     print(f"Found {len(nor_files)} _NOR.txt files")
@@ -241,13 +314,13 @@ def process_folder(api_base_url: str, folder_name: str, data_dir: str, batch_siz
         print(f"No _NOR.txt files found in {folder_name}")
         return pd.DataFrame()
 
-    # Prepare results storage
-    all_results = []
+    # Prepare all batches up front so they can be evaluated concurrently
+    batches = []
+    total_batches = (len(nor_files) - 1) // batch_size + 1
 
-    # Process files in batches
     for i in range(0, len(nor_files), batch_size):
         batch_files = nor_files[i:i+batch_size]
-        print(f"\nProcessing batch {i//batch_size + 1}/{(len(nor_files)-1)//batch_size + 1} "
+        print(f"Preparing batch {i//batch_size + 1}/{total_batches} "
               f"({len(batch_files)} files)...")
 
         # Prepare batch items
@@ -271,12 +344,10 @@ def process_folder(api_base_url: str, folder_name: str, data_dir: str, batch_siz
                 continue
 
             # Get consigna from CSV
-            consigna_row = consignas_df[consignas_df['ID'].astype(str) == text_id]
-            if consigna_row.empty:
+            consigna = consigna_by_id.get(text_id)
+            if consigna is None:
                 print(f"  Warning: No consigna found for ID {text_id}")
                 consigna = "N/A"
-            else:
-                consigna = consigna_row.iloc[0]['Consigna']
 
             # Prepare API item
             batch_items.append({
@@ -298,28 +369,35 @@ def process_folder(api_base_url: str, folder_name: str, data_dir: str, batch_siz
             print("  No valid items in this batch, skipping...")
             continue
 
-        # Evaluate batch
-        results = evaluate_texts(api_base_url, batch_items)
-
-        # Match results with metadata
-        for result in results:
-            id_alumno = result.get('id_alumno')
-            metadata = next((m for m in file_metadata if m['id'] == id_alumno), None)
-
-            if metadata:
-                all_results.append({
-                    'folder': folder_name,
-                    'id': id_alumno,
-                    'filename': metadata['filename'],
-                    'curso': metadata['curso'],
-                    'consigna': metadata['consigna'],
-                    'nota': result.get('nota'),
-                    'feedback': result.get('feedback')
-                })
-
-        # Small delay between batches to avoid overwhelming the API
-        if i + batch_size < len(nor_files):
-            time.sleep(1)
+        # Index metadata by ID (first entry wins, as with a linear search)
+        metadata_by_id = {m['id']: m for m in reversed(file_metadata)}
+        label = f"[batch {i//batch_size + 1}/{total_batches}]"
+        batches.append((label, batch_items, metadata_by_id))
+
+    # Evaluate batches concurrently; the pool size bounds the in-flight jobs
+    print(f"\nEvaluating {len(batches)} batches ({concurrency} at a time)...")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        batch_results = executor.map(
+            lambda batch: evaluate_texts(session, api_base_url, batch[1], batch[0]), batches
+        )
+
+        # Match results with metadata, in batch order
+        all_results = []
+        for (_, _, metadata_by_id), results in zip(batches, batch_results):
+            for result in results:
+                id_alumno = result.get('id_alumno')
+                metadata = metadata_by_id.get(id_alumno)
+
+                if metadata:
+                    all_results.append({
+                        'folder': folder_name,
+                        'id': id_alumno,
+                        'filename': metadata['filename'],
+                        'curso': metadata['curso'],
+                        'consigna': metadata['consigna'],
+                        'nota': result.get('nota'),
+                        'feedback': result.get('feedback')
+                    })
 
     # Create DataFrame
     results_df = pd.DataFrame(all_results)
@@ -335,7 +413,7 @@ def process_folder(api_base_url: str, folder_name: str, data_dir: str, batch_siz
     return results_df
 
 
-def check_api_health(api_base_url: str) -> bool:
+def check_api_health(session: requests.Session, api_base_url: str) -> bool:
     """
     Check if the API is healthy and ready to accept requests.
     Returns True if healthy, False otherwise.
@@ -343,7 +421,7 @@ def check_api_health(api_base_url: str) -> bool:
     print("Checking API health...")
     try:
         health_url = f"{api_base_url}/health"
-        response = requests.get(health_url, timeout=10)
+        response = session.get(health_url, timeout=10)
         response.raise_for_status()
         health_data = response.json()
 
@@ -361,12 +439,16 @@ def check_api_health(api_base_url: str) -> bool:
 def combine_results(folders: List[str], data_dir: str, timestamp: str) -> None:
     """
     Combine all results from different folders into a single CSV.
+
+    The per-folder CSVs are concatenated as text when their headers match, so
+    the feedback column is never parsed; the summary only reads folder and nota.
     """
     print(f"\n{'='*80}")
     print("Combining results from all folders")
     print(f"{'='*80}\n")
 
-    all_results = []
+    latest_csvs = []
+    all_stats = []
 
     for folder_name in folders:
         folder_path = Path(data_dir) / folder_name
@@ -375,23 +457,55 @@ def combine_results(folders: List[str], data_dir: str, timestamp: str) -> None:
         if csv_files:
             # Get the most recent file
             latest_csv = csv_files[-1]
-            df = pd.read_csv(latest_csv)
-            all_results.append(df)
-            print(f"Loaded {len(df)} results from {latest_csv.name}")
-
-    if all_results:
-        combined_df = pd.concat(all_results, ignore_index=True)
+            stats_df = pd.read_csv(latest_csv, usecols=['folder', 'nota'],
+                                   dtype={'folder': 'category', 'nota': 'float32'},
+                                   engine='pyarrow')
+            latest_csvs.append(latest_csv)
+            all_stats.append(stats_df)
+            print(f"Loaded {len(stats_df)} results from {latest_csv.name}")
+
+    if latest_csvs:
         combined_output = f"results_all_folders_{timestamp}.csv"
-        combined_df.to_csv(combined_output, index=False, encoding='utf-8')
+        headers = []
+        for latest_csv in latest_csvs:
+            with open(latest_csv, 'r', encoding='utf-8', newline='') as f:
+                headers.append(f.readline())
+
+        if len(set(headers)) == 1:
+            with open(combined_output, 'w', encoding='utf-8', newline='') as out:
+                out.write(headers[0])
+                for latest_csv in latest_csvs:
+                    with open(latest_csv, 'r', encoding='utf-8', newline='') as f:
+                        f.readline()  # Skip the header
+                        shutil.copyfileobj(f, out)
+        else:
+            # Columns differ between folders: let pandas align them
+            combined_df = pd.concat([pd.read_csv(c) for c in latest_csvs], ignore_index=True)
+            combined_df.to_csv(combined_output, index=False, encoding='utf-8')
+
+        combined_stats = pd.concat(all_stats, ignore_index=True)
 
         print(f"\n✓ Combined results saved to: {combined_output}")
-        print(f"\nTotal results: {len(combined_df)}")
+        print(f"\nTotal results: {len(combined_stats)}")
         print(f"\nOverall statistics:")
-        print(combined_df.groupby('folder')['nota'].describe())
+        print(combined_stats.groupby('folder', observed=True)['nota'].describe())
     else:
         print("No results files found to combine")
 
 
+def positive_int(value: str) -> int:
+    """
+    argparse type for options that must be a whole number of at least 1.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def main():
     """
     Main execution function.
@@ -403,6 +517,7 @@ def main():
 Examples:
   %(prog)s --api-host https://your-runpod-instance.proxy.runpod.net
   %(prog)s --api-host http://localhost:8000 --batch-size 20
+  %(prog)s --api-host http://localhost:8000 --concurrency 8
   %(prog)s --api-host https://api.example.com --folders POS1 POS2
   %(prog)s --api-host https://api.example.com --no-combine
         """
@@ -435,6 +550,12 @@ Examples:
         default=DEFAULT_BATCH_SIZE,
         help=f'Batch size for processing (default: {DEFAULT_BATCH_SIZE})'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=positive_int,
+        default=DEFAULT_CONCURRENCY,
+        help=f'Number of batches evaluated concurrently (default: {DEFAULT_CONCURRENCY})'
+    )
     parser.add_argument(
         '--no-combine',
         action='store_true',
@@ -462,11 +583,15 @@ Examples:
     print(f"Folders to process: {', '.join(args.folders)}")
     print(f"Data directory: {args.data_dir}")
     print(f"Batch size: {args.batch_size}")
+    print(f"Concurrency: {args.concurrency}")
     print()
 
+    # One connection per concurrent batch
+    session = create_session(args.concurrency)
+
     # Check API health
     if not args.skip_health_check:
-        check_api_health(api_base_url)
+        check_api_health(session, api_base_url)
 
     # Generate timestamp for output files
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -475,7 +600,8 @@ Examples:
     for folder_name in args.folders:
         try:
             # Process folder
-            results_df = process_folder(api_base_url, folder_name, args.data_dir, args.batch_size)
+            results_df = process_folder(session, api_base_url, folder_name, args.data_dir,
+                                        args.batch_size, args.concurrency)
 
             if results_df.empty:
                 print(f"No results for {folder_name}, skipping CSV generation\n")
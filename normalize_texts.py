@@ -8,13 +8,39 @@ step to remove content within brackets.
 
 Usage:
     python normalize_texts.py
+    python normalize_texts.py --skip-existing
 """
 
+import argparse
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 
+# Files handed to each worker process at a time
+CHUNK_SIZE = 32
+
+
+# Precompiled patterns for the regex steps of normalize_text
+_S_MARKER = re.compile(r'@s(?::\w+)?')
+_AP = re.compile(r'\s*\[% AP\]\s*')
+_BRACKETS = re.compile(r'\[.*?\]')
+
+# Steps 4-6 run as one pass: none of their replacements can complete
+# another one's marker, so the result is the same as three sequential passes
+_PERCENT_MARKERS = re.compile(r'\[% (?:interrogació|exclamació|suspensius)\]')
+_PERCENT_REPLACEMENTS = {
+    '[% interrogació]': '?',
+    '[% exclamació]': '!',
+    '[% suspensius]': '...',
+}
+
+
+def _percent_replacement(match):
+    return _PERCENT_REPLACEMENTS[match.group()]
+
+
 def normalize_text(text):
     """
     Apply all normalization transformations to the input text.
@@ -31,6 +57,10 @@ def normalize_text(text):
     9. Remove everything between brackets [...] (NEW)
     10. Trim whitespace
 
+    Each step sees the output of the previous one, as in
+    PlanTextToPlainTextNormalizedMapper.js. Regex steps are skipped when the
+    text cannot contain a match, which is most of the time.
+
     Args:
         text (str): The input text to normalize
 
@@ -41,33 +71,46 @@ def normalize_text(text):
     text = text.replace('@o', '')
 
     # 2. Remove @s markers (including @s:\w+ patterns)
-    text = re.sub(r'@s(?::\w+)?', '', text)
+    if '@s' in text:
+        text = _S_MARKER.sub('', text)
 
     # 3. Replace space-dot-newline with single spaces
-    text = re.sub(r' \.\n', ' ', text)
-
-    # 4. Replace [% interrogació] with ?
-    text = text.replace('[% interrogació]', '?')
+    text = text.replace(' .\n', ' ')
 
-    # 5. Replace [% exclamació] with !
-    text = text.replace('[% exclamació]', '!')
-
-    # 6. Replace [% suspensius] with ...
-    text = text.replace('[% suspensius]', '...')
+    # 4-6. Replace [% interrogació], [% exclamació] and [% suspensius]
+    if '[% ' in text:
+        text = _PERCENT_MARKERS.sub(_percent_replacement, text)
 
     # 7. Replace [% punt AP] surrounded by spaces with period and double newlines
-    text = re.sub(r' \[% punt AP\] ', '.\n\n', text)
+    text = text.replace(' [% punt AP] ', '.\n\n')
 
     # 8. Replace [% AP] (with optional spacing) with double newlines
-    text = re.sub(r'\s*\[% AP\]\s*', '\n\n', text)
+    if '[% AP]' in text:
+        text = _AP.sub('\n\n', text)
 
     # 9. Remove everything between brackets [...] (including the brackets)
-    text = re.sub(r'\[.*?\]', '', text)
+    if '[' in text:
+        text = _BRACKETS.sub('', text)
 
     # 10. Trim whitespace
-    text = text.strip()
+    return text.strip()
+
+
+def write_text(path, text):
+    """
+    Write text as UTF-8 with a single encode and raw os.write() calls.
 
-    return text
+    Args:
+        path (Path): Path to the file, created or truncated
+        text (str): The text to write
+    """
+    data = memoryview(text.encode('utf-8'))
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
 
 
 def process_file(input_path):
@@ -92,16 +135,62 @@ def process_file(input_path):
     output_path = input_path.parent / output_filename
 
     # Write the normalized text
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(normalized_text)
+    write_text(output_path, normalized_text)
 
     return output_path
 
 
+def _process_file_safe(input_path):
+    """
+    Run process_file in a worker, returning the error message instead of raising
+    so one bad file doesn't abort the rest of the batch.
+
+    Returns:
+        str or None: The error message, or None on success
+    """
+    try:
+        process_file(input_path)
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def find_source_files(subdir_path, skip_existing=False):
+    """
+    List the .txt files in a directory that are not _NOR outputs, using a
+    single os.scandir() pass.
+
+    Args:
+        subdir_path (Path): Directory to scan
+        skip_existing (bool): Also leave out files whose _NOR version already exists
+
+    Returns:
+        list: Paths of the files to normalize, sorted by name
+    """
+    with os.scandir(subdir_path) as entries:
+        names = {entry.name for entry in entries if entry.name.endswith('.txt')}
+
+    # The set is only used for the _NOR lookups; iterate in sorted order so
+    # progress and error output is the same on every run
+    return [
+        subdir_path / name for name in sorted(names)
+        if not name.endswith('_NOR.txt')
+        and not (skip_existing and name[:-len('.txt')] + '_NOR.txt' in names)
+    ]
+
+
 def main():
     """
     Main function to process all .txt files in data directories.
     """
+    parser = argparse.ArgumentParser(description='Normalize Catalan text files in the data directories')
+    parser.add_argument(
+        '--skip-existing',
+        action='store_true',
+        help='Skip files that already have a _NOR version'
+    )
+    args = parser.parse_args()
+
     # Define the data directory
     data_dir = Path(__file__).parent / 'data'
 
@@ -114,30 +203,30 @@ def main():
     print("Starting text normalization...")
     print("=" * 60)
 
-    for subdir in subdirs:
-        subdir_path = data_dir / subdir
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for subdir in subdirs:
+            subdir_path = data_dir / subdir
 
-        if not subdir_path.exists():
-            print(f"Warning: Directory {subdir_path} does not exist. Skipping.")
-            continue
+            if not subdir_path.exists():
+                print(f"Warning: Directory {subdir_path} does not exist. Skipping.")
+                continue
 
-        # Find all .txt files that don't end with _NOR.txt
-        txt_files = [f for f in subdir_path.glob('*.txt') if not f.stem.endswith('_NOR')]
+            # Find all .txt files that don't end with _NOR.txt
+            txt_files = find_source_files(subdir_path, args.skip_existing)
 
-        print(f"\nProcessing {subdir}/ ({len(txt_files)} files)...")
+            print(f"\nProcessing {subdir}/ ({len(txt_files)} files)...")
 
-        for txt_file in txt_files:
-            total_files += 1
-            try:
-                output_file = process_file(txt_file)
-                processed_files += 1
+            errors = executor.map(_process_file_safe, txt_files, chunksize=CHUNK_SIZE)
+            for txt_file, error in zip(txt_files, errors):
+                total_files += 1
+                if error is not None:
+                    print(f"  Error processing {txt_file.name}: {error}")
+                    continue
 
+                processed_files += 1
                 if processed_files % 100 == 0:
                     print(f"  Processed {processed_files}/{total_files} files...")
 
-            except Exception as e:
-                print(f"  Error processing {txt_file.name}: {e}")
-
     print("\n" + "=" * 60)
     print(f"Normalization complete!")
     print(f"Total files processed: {processed_files}/{total_files}")